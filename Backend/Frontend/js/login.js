@@ -121,6 +121,7 @@ async function performLogin(username, password) {
         role: data.role ?? data.user?.role,
         organization_id: data.organization_id ?? data.user?.organization_id,
         organization_name: data.organization_name ?? data.user?.organization_name,
+        token: data.access_token,
       };
 
       sessionStorage.setItem("user", JSON.stringify(userData));
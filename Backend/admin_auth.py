@@ -1,19 +1,34 @@
 # admin_auth.py
 import os
 import ssl
+import logging
+import asyncio
+import hashlib
 import smtplib
 import secrets
 import string
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
-from typing import List
-
-import bcrypt
-from fastapi import APIRouter, Depends, HTTPException, status, Form
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-
-from database import get_db
+from html import escape
+from typing import List, Literal
+
+import jwt
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status, Form
+from fastapi.responses import ORJSONResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from passlib.context import CryptContext
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import bindparam, select, update, func, case, and_, or_, exists, literal
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from database import AsyncSessionLocal, get_async_db
 from models import User, Organization, Document, Chat, ChatMessage, Feedback, SuperAdmin
 from schemas import (
     OrgCreate,
@@ -24,25 +39,264 @@ from schemas import (
     SuperAdminLogin,
 )
 
-router = APIRouter(prefix="/admin", tags=["admin"])
+# orjson renders every response, including the dict/model ones that still go through response_model
+router = APIRouter(prefix="/admin", tags=["admin"], default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
 
 # =========================================================
 # Utilities
 # =========================================================
 
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt."""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+def _argon2_param(name: str, default: int, minimum: int) -> int:
+    """Read an argon2 parameter from the environment, failing fast below its minimum."""
+    value = int(os.getenv(name, str(default)))
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {value}")
+    return value
+
+# argon2id parameters for stored passwords (OWASP's m=19 MiB, t=2, p=1 baseline; ~20-30 ms per
+# hash). Dev/CI can set ARGON2_TIME_COST=1 and ARGON2_MEMORY_COST=1024 to make hashing cheap.
+# Stored hashes with other parameters, or still on bcrypt, are re-hashed on the next successful login.
+ARGON2_TIME_COST = _argon2_param("ARGON2_TIME_COST", 2, 1)
+ARGON2_MEMORY_COST = _argon2_param("ARGON2_MEMORY_COST", 19 * 1024, 8)  # KiB
+ARGON2_PARALLELISM = _argon2_param("ARGON2_PARALLELISM", 1, 1)
+
+# Module-wide hasher: argon2id for new hashes; bcrypt is kept only to verify legacy hashes
+# (deprecated="auto" flags them through needs_update so logins migrate them).
+# The "bootstrap" and "temp" categories (bootstrapped super-admins, generated temporary
+# passwords that must be changed on first login) use a single pass; they are upgraded too.
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__type="ID",
+    argon2__rounds=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+    bootstrap__argon2__rounds=1,
+    temp__argon2__rounds=1,
+)
+
+def hash_password(password: str, category: str | None = None) -> str:
+    """Hash a password with argon2id ("bootstrap"/"temp" categories use a single pass)."""
+    return pwd_context.hash(password, category=category)
+
+_ARGON2_PARAMS = (ARGON2_MEMORY_COST, ARGON2_TIME_COST, ARGON2_PARALLELISM)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    True if the stored hash uses a deprecated scheme (bcrypt) or argon2 parameters
+    ("$argon2id$v=19$m=<kib>,t=<passes>,p=<lanes>$...") other than the current ones,
+    so a login can upgrade it.
+    """
+    if pwd_context.needs_update(hashed_password):
+        return True
+    try:
+        params = dict(kv.split("=") for kv in hashed_password.split("$")[3].split(","))
+        return (int(params["m"]), int(params["t"]), int(params["p"])) != _ARGON2_PARAMS
+    except (IndexError, KeyError, ValueError):
+        return True
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+    return pwd_context.verify(password, hashed_password)
+
+# Verified in place of a missing user's hash, so an unknown username costs as much as a wrong
+# password. Starts on the current argon2id parameters; _match_dummy_hash re-derives it at startup
+# from the most common stored hash, since while logins migrate bcrypt hashes those may dominate.
+# Accounts on the less common scheme/cost stay distinguishable by timing until they are rehashed.
+_DUMMY_PASSWORD = "dummy-password"
+_DUMMY_HASH = hash_password(_DUMMY_PASSWORD)
+
+def _dummy_hash_like(profile: str) -> str:
+    """
+    Dummy hash with the scheme and cost of `profile`: a bcrypt prefix ("$2b$12$") or an
+    argon2 parameter segment ("m=19456,t=2,p=1").
+    """
+    if profile.startswith("$2"):
+        return pwd_context.handler("bcrypt").using(rounds=int(profile[4:6])).hash(_DUMMY_PASSWORD)
+    params = dict(kv.split("=") for kv in profile.split(","))
+    return pwd_context.handler("argon2").using(
+        type="ID",
+        memory_cost=int(params["m"]),
+        rounds=int(params["t"]),
+        parallelism=int(params["p"]),
+    ).hash(_DUMMY_PASSWORD)
+
+def verify_user_password(user, password: str) -> bool:
+    """
+    Verify a password for a possibly-missing account (User or SuperAdmin).
+    Always runs the hash so response time does not reveal whether the username exists.
+    """
+    hashed_password = user.password_hash if user is not None else _DUMMY_HASH
+    ok = verify_password(password, hashed_password)
+    return ok and user is not None
+
+# argon2-cffi and bcrypt both release the GIL, so hashes run in parallel here; sized to the CPU
+# count so a burst of logins cannot oversubscribe the cores while the event loop keeps serving.
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="pwhash")
+
+async def hash_password_async(password: str, category: str | None = None) -> str:
+    """hash_password on the hashing pool, for async routes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_HASH_POOL, hash_password, password, category)
+
+async def verify_user_password_async(user, password: str) -> bool:
+    """verify_user_password on the hashing pool, for async routes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_HASH_POOL, verify_user_password, user, password)
+
+async def _most_common_hash_profile(db: AsyncSession) -> str | None:
+    """Scheme/cost of the most common active user hash, in the form _dummy_hash_like takes."""
+    profiles = select(
+        case(
+            (User.password_hash.like("$2%"), func.left(User.password_hash, 7)),
+            else_=func.split_part(User.password_hash, "$", 4),
+        ).label("profile")
+    ).where(User.is_active == True).subquery()
+    return await db.scalar(
+        select(profiles.c.profile)
+        .group_by(profiles.c.profile)
+        .order_by(func.count().desc())
+        .limit(1)
+    )
+
+@router.on_event("startup")
+async def _match_dummy_hash() -> None:
+    global _DUMMY_HASH
+    async with AsyncSessionLocal() as db:
+        profile = await _most_common_hash_profile(db)
+    if profile is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+        _DUMMY_HASH = await loop.run_in_executor(_HASH_POOL, _dummy_hash_like, profile)
+    except (KeyError, ValueError) as e:
+        logger.warning("Keeping the default dummy hash; unrecognised stored hash %r: %s", profile, e)
+
+async def upgrade_password_hash(db: AsyncSession, account, password: str) -> None:
+    """
+    After a successful login, re-hash the password with the current argon2id parameters
+    if the stored hash is bcrypt or uses different ones. Failures are logged and never block the login.
+    """
+    if not password_needs_rehash(account.password_hash):
+        return
+    try:
+        account.password_hash = await hash_password_async(password)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning("Failed to upgrade password hash: %s", e)
+
+# Unique constraints/indexes on users -> client-facing message for a conflicting insert.
+# users_email_key also fires for an email held by an inactive account, which the
+# active-only pre-checks don't see.
+_CONFLICT_DETAILS = {
+    "users_username_key": "Username already exists",
+    "users_email_key": "Email already exists",
+    "ux_users_email_active_lower": "Email already exists",
+}
+
+def _constraint_name(e: IntegrityError) -> str | None:
+    """Violated constraint: psycopg2 exposes it on .diag, asyncpg on the exception SQLAlchemy wraps."""
+    diag = getattr(e.orig, "diag", None)
+    if diag is not None:
+        return diag.constraint_name
+    return getattr(e.orig.__cause__, "constraint_name", None)
+
+def _conflict_detail(e: IntegrityError) -> str | None:
+    """
+    Map a unique-constraint violation on insert to the client-facing message,
+    or None if it is some other integrity error.
+    """
+    return _CONFLICT_DETAILS.get(_constraint_name(e))
+
+# PostgreSQL SQLSTATE -> client-facing message for failed user deactivations
+_DEACTIVATE_ERROR_DETAILS = {
+    "23503": "Cannot delete user due to remaining references. Please contact support.",
+    "42501": "Permission denied. You may not have the right to delete this user.",
+    "23505": "Database constraint violation. Please contact support.",
+    "57014": "Database operation timed out. Please try again.",
+    "55P03": "Database operation timed out. Please try again.",
+    "40P01": "Database deadlock detected. Please try again.",
+}
+
+def _deactivate_error_detail(e: Exception) -> str:
+    """Pick the message for a failed deactivation from the exception type and SQLSTATE."""
+    if isinstance(e, DBAPIError):
+        detail = _DEACTIVATE_ERROR_DETAILS.get(getattr(e.orig, "pgcode", None))
+        if detail:
+            return detail
+        # Connection-level failures carry no SQLSTATE
+        if isinstance(e, OperationalError):
+            return "Database connection error. Please try again."
+    return f"Failed to delete user: {e}"
+
+_TEMP_PASSWORD_ALPHABET = tuple(string.ascii_letters + string.digits + "!@#$%^&*()-_=+")
+# Largest multiple of the alphabet size that fits in a byte; higher bytes are rejected so
+# every character stays equally likely
+_TEMP_PASSWORD_LIMIT = (256 // len(_TEMP_PASSWORD_ALPHABET)) * len(_TEMP_PASSWORD_ALPHABET)
 
 def generate_temp_password(length: int = 12) -> str:
     """Generate a random strong temporary password."""
-    alphabet = string.ascii_letters + string.digits + "!@#$%^&*()-_=+"
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+    alphabet = _TEMP_PASSWORD_ALPHABET
+    # One getrandom() call for the whole password, with headroom for rejected bytes
+    chars = [alphabet[b % len(alphabet)] for b in secrets.token_bytes(length * 2) if b < _TEMP_PASSWORD_LIMIT]
+    del chars[length:]
+    while len(chars) < length:
+        chars.append(secrets.choice(alphabet))
+    return "".join(chars)
+
+# --- Access tokens ---
+# HS256 tokens issued at login. Every worker must verify with the same key, so there is no
+# per-process fallback: a random key would make tokens fail on any worker but the issuing one.
+# Checked when the app starts rather than on import, so scripts that only hash passwords
+# (setup_super_admin.py) don't need it.
+JWT_SECRET = os.getenv("JWT_SECRET")
+JWT_TTL = int(os.getenv("JWT_TTL", "28800"))  # seconds
+_bearer = HTTPBearer(auto_error=False)
+
+def _jwt_secret() -> str:
+    if not JWT_SECRET:
+        raise RuntimeError("JWT_SECRET is not set")
+    return JWT_SECRET
+
+@router.on_event("startup")
+def _require_jwt_secret() -> None:
+    _jwt_secret()
+
+def _sign_token(claims: dict) -> str:
+    return jwt.encode({**claims, "exp": int(time.time()) + JWT_TTL}, _jwt_secret(), algorithm="HS256")
+
+def issue_access_token(user) -> str:
+    """Signed token naming the user, their role and organization."""
+    return _sign_token({"sub": str(user.id), "role": user.role, "org": str(user.organization_id)})
+
+def issue_super_admin_token(super_admin) -> str:
+    """Signed super-admin token (super-admins belong to no organization)."""
+    return _sign_token({"sub": str(super_admin.id), "role": "super-admin"})
+
+def _token_claims(credentials: HTTPAuthorizationCredentials | None, role: str) -> dict:
+    """Claims of a valid bearer token for `role`: 401 missing/invalid token, 403 other role."""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = jwt.decode(credentials.credentials, _jwt_secret(), algorithms=["HS256"])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    if claims.get("role") != role:
+        raise HTTPException(status_code=403, detail=f"{role.capitalize()} privileges required")
+    return claims
+
+async def require_admin(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> dict:
+    """
+    Dependency: claims of a valid admin bearer token. Rejects the request before any
+    DB or password-hashing work (401 missing/invalid token, 403 not an admin).
+    """
+    return _token_claims(credentials, "admin")
+
+async def require_super_admin(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> dict:
+    """Dependency: claims of a valid super-admin bearer token (401/403 as for require_admin)."""
+    return _token_claims(credentials, "super-admin")
 
 # --- Email config ---
 SMTP_HOST = os.getenv("SMTP_HOST")
@@ -50,16 +304,139 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
 SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "no-reply@example.com")
+# Seconds an unused SMTP connection is kept open before it is closed and re-opened
+SMTP_IDLE_TIMEOUT = int(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
 # Used to create absolute links in emails
 APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
+# Built once: loading the CA bundle is disk I/O + X.509 parsing, and the context is reusable
+_SSL_CTX = ssl.create_default_context()
+
+class SMTPPool:
+    """
+    Keeps one authenticated STARTTLS connection open and reuses it across sends,
+    so the TLS handshake and AUTH are paid once instead of per email.
+    The connection is checked with NOOP before reuse and re-opened when it was
+    dropped or has been idle longer than idle_timeout.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        idle_timeout: int = 60,
+        ssl_context: ssl.SSLContext = _SSL_CTX,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self._server: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port)
+        server.starttls(context=self.ssl_context)
+        server.login(self.user, self.password)
+        return server
+
+    def _get_server(self) -> smtplib.SMTP:
+        if self._server is not None:
+            if time.monotonic() - self._last_used > self.idle_timeout:
+                self.close()
+            else:
+                try:
+                    if self._server.noop()[0] == 250:
+                        return self._server
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self.close()
+        self._server = self._connect()
+        return self._server
+
+    def send(self, msg: EmailMessage) -> None:
+        self.send_many([msg])
+
+    def send_many(self, messages) -> None:
+        """Send several messages over the same connection."""
+        with self._lock:
+            server = self._get_server()
+            for msg in messages:
+                try:
+                    server.send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Dropped between NOOP and DATA: reconnect once and retry
+                    self.close()
+                    server = self._get_server()
+                    server.send_message(msg)
+                self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        self._server = None
+
+_smtp_pool: SMTPPool | None = None
+
+def get_smtp() -> SMTPPool:
+    """Process-wide SMTP connection, created on first use."""
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPPool(SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, idle_timeout=SMTP_IDLE_TIMEOUT)
+    return _smtp_pool
+
+# Credentials email shared by admin and user creation; placeholders are filled HTML-escaped
+_ACCOUNT_EMAIL_TMPL = string.Template("""
+<div style="font-family:Segoe UI,Roboto,Arial,sans-serif;font-size:14px;color:#111;">
+  <h2 style="margin:0 0 12px;">${heading}</h2>
+  <p>Hello ${username},</p>
+  <p>Your ${account_kind} has been created for <b>${organization_name}</b>.</p>
+  <p><b>Username:</b> ${username}<br/>
+     <b>Temporary Password:</b> <code style="font-size:16px;">${password}</code></p>
+  <p>Please <a href="${login_url}" style="color:#6c2bd9;">change your password</a> before your first login. After changing, sign in normally.</p>
+  <hr style="border:none;border-top:1px solid #eee;margin:16px 0;" />
+  <p style="color:#555;">If you didn’t expect this email, you can ignore it.</p>
+</div>
+""")
+
+def render_account_email(
+    username: str,
+    organization_name: str,
+    plain_password: str,
+    user_id: uuid.UUID,
+    is_admin: bool,
+) -> str:
+    """Render the credentials email for a newly created account."""
+    return _ACCOUNT_EMAIL_TMPL.substitute(
+        heading="Your Admin Account" if is_admin else "Your Account",
+        account_kind="admin account" if is_admin else "account",
+        username=escape(username),
+        organization_name=escape(organization_name),
+        password=escape(plain_password),
+        login_url=escape(f"{APP_BASE_URL}/change-password?user_id={user_id}"),
+    )
 
 def send_email(to_email: str, subject: str, html_body: str) -> None:
     """
-    Sends an HTML email using STARTTLS.
+    Sends an HTML email using STARTTLS over the shared SMTP connection.
     Falls back to console if SMTP credentials are not configured.
     """
     if not (SMTP_HOST and SMTP_USER and SMTP_PASS):
-        print(f"[EMAIL MOCK] To: {to_email}\nSubject: {subject}\n\n{html_body}")
+        logger.info("[EMAIL MOCK] To: %s\nSubject: %s\n\n%s", to_email, subject, html_body)
         return
 
     msg = EmailMessage()
@@ -69,22 +446,33 @@ def send_email(to_email: str, subject: str, html_body: str) -> None:
     msg.set_content("This message contains HTML. Please view with an HTML-capable client.")
     msg.add_alternative(html_body, subtype="html")
 
-    context = ssl.create_default_context()
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls(context=context)
-        server.login(SMTP_USER, SMTP_PASS)
-        server.send_message(msg)
+    get_smtp().send(msg)
+
+def send_email_background(to_email: str, subject: str, html_body: str) -> None:
+    """send_email for BackgroundTasks: runs after the response, so failures are only logged."""
+    try:
+        send_email(to_email, subject, html_body)
+    except Exception as e:
+        logger.warning("Failed to send email to %s: %s", to_email, e)
 
 # =========================================================
 # Pydantic models for admin registration / user creation
 # =========================================================
 
-class AdminRegisterRequest(BaseModel):
+# Request bodies are read-only inputs; unknown keys are rejected (422) instead of parsed and dropped
+_REQUEST_CONFIG = ConfigDict(frozen=True, extra="forbid")
+
+class NewAccountRequest(BaseModel):
+    """Fields shared by the account-creation payloads; password None means a temp one is generated."""
+    model_config = _REQUEST_CONFIG
     username: str = Field(..., min_length=3, max_length=50)
     password: str | None = Field(default=None, min_length=6, max_length=100)
     email: str | None = None
     organization_id: uuid.UUID
 
+class AdminRegisterRequest(NewAccountRequest):
+    pass
+
 class AdminRegisterResponse(BaseModel):
     message: str
     user_id: uuid.UUID
@@ -92,71 +480,273 @@ class AdminRegisterResponse(BaseModel):
     organization_name: str
 
 class UserLoginRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
     username: str
     password: str
 
-class CreateUserRequest(BaseModel):
-    username: str = Field(..., min_length=3, max_length=50)
-    password: str | None = Field(default=None, min_length=6, max_length=100)
-    role: str = Field(..., pattern="^(admin|user)$")
-    organization_id: uuid.UUID
-    email: str | None = None
+class CreateUserRequest(NewAccountRequest):
+    role: Literal["admin", "user"]
+
+# =========================================================
+# Query helpers
+# =========================================================
+
+# Hot lookups built once at import; each call only binds parameters
+_STMT_USER_BY_USERNAME = select(User).where(User.username == bindparam("username"), User.is_active == True)
+_STMT_SUPER_ADMIN_BY_USERNAME = select(SuperAdmin).where(SuperAdmin.username == bindparam("username"))
+_STMT_ACTIVE_ORG_NAME = select(Organization.name).where(
+    Organization.id == bindparam("org_id"), Organization.is_active == True
+)
+_STMT_ORG_IS_ACTIVE = select(
+    exists().where(Organization.id == bindparam("org_id"), Organization.is_active == True)
+)
+
+async def _check_new_account(
+    db: AsyncSession,
+    username: str,
+    organization_id: uuid.UUID,
+    email: str | None,
+    active_org_only: bool = True,
+):
+    """
+    Run the pre-insert checks for a new account in one round trip.
+    Returns a row with username_taken, organization_name (None if the org is missing) and email_taken.
+    """
+    org_filters = [Organization.id == organization_id]
+    if active_org_only:
+        org_filters.append(Organization.is_active == True)
+
+    if email:
+        email_taken = exists().where(
+            User.email != None,
+            User.is_active == True,
+            func.lower(User.email) == email.lower(),
+        )
+    else:
+        email_taken = literal(False)
+
+    result = await db.execute(
+        select(
+            exists().where(User.username == username).label("username_taken"),
+            select(Organization.name).where(*org_filters).scalar_subquery().label("organization_name"),
+            email_taken.label("email_taken"),
+        )
+    )
+    return result.one()
+
+async def _user_for_deactivation(db: AsyncSession, user_id: uuid.UUID):
+    """
+    Fetch an active user together with the number of active admins in their organization,
+    in one round trip. Returns None if the user is missing or already inactive.
+    """
+    peer = aliased(User)
+    admin_count = (
+        select(func.count())
+        .select_from(peer)
+        .where(
+            peer.organization_id == User.organization_id,
+            peer.role == "admin",
+            peer.is_active == True,
+        )
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(User.username, User.role, User.organization_id, admin_count.label("admin_count"))
+        .where(User.id == user_id, User.is_active == True)
+    )
+    return result.first()
+
+async def _deactivate_user(db: AsyncSession, user_id: uuid.UUID) -> bool:
+    """
+    Deactivate an active user unless they are the last active admin of their organization.
+    The last-admin check runs inside the UPDATE and locks the org's admin rows, so two
+    concurrent deactivations can't both pass it. Returns False if no row was updated.
+    """
+    owner = aliased(User)
+    peer = aliased(User)
+    target_org = select(owner.organization_id).where(owner.id == user_id).scalar_subquery()
+    org_admins = (
+        select(peer.id)
+        .where(peer.organization_id == target_org, peer.role == "admin", peer.is_active == True)
+        .with_for_update()
+        .subquery()
+    )
+    admin_count = select(func.count()).select_from(org_admins).scalar_subquery()
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id, User.is_active == True, or_(User.role != "admin", admin_count > 1))
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+USERS_PAGE_MAX = 1000
+
+async def _active_users_page(db: AsyncSession, org_id: uuid.UUID, after: uuid.UUID | None, limit: int):
+    """
+    One keyset page of active users in an active organization, ordered by id, with the
+    organization name joined in. Returns (rows, next_cursor); next_cursor is None on the last page.
+    An empty page means no more users or an inactive/missing organization; see _org_is_active.
+    """
+    stmt = (
+        select(User.id, User.username, User.role, User.created_at, Organization.name.label("organization_name"))
+        .join(Organization, and_(Organization.id == User.organization_id, Organization.is_active == True))
+        .where(User.organization_id == org_id, User.is_active == True)
+        .order_by(User.id)
+        .limit(limit + 1)
+    )
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    rows = (await db.execute(stmt)).all()
+    if len(rows) > limit:
+        return rows[:limit], str(rows[limit - 1].id)
+    return rows, None
+
+async def _org_is_active(db: AsyncSession, org_id: uuid.UUID) -> bool:
+    return await db.scalar(_STMT_ORG_IS_ACTIVE, {"org_id": org_id})
+
+# Token holder is still an active admin of the (active) organization named in the token
+_STMT_ADMIN_STILL_ACTIVE = select(
+    exists().where(
+        User.id == bindparam("user_id"),
+        User.organization_id == bindparam("org_id"),
+        User.role == "admin",
+        User.is_active == True,
+        Organization.id == User.organization_id,
+        Organization.is_active == True,
+    )
+)
+
+async def _ensure_admin_active(db: AsyncSession, admin: dict) -> None:
+    """
+    require_admin only checks the token; an admin deactivated (or whose org was deactivated)
+    after login would otherwise keep these rights until it expires. 401 if so.
+    """
+    params = {"user_id": uuid.UUID(admin["sub"]), "org_id": uuid.UUID(admin["org"])}
+    if not await db.scalar(_STMT_ADMIN_STILL_ACTIVE, params):
+        raise HTTPException(status_code=401, detail="Account is no longer active", headers={"WWW-Authenticate": "Bearer"})
+
+# Active organization names by id, plus the active-organization dropdown list (serialized body
+# and its ETag). Organizations rarely change while every login and page load reads them; call
+# invalidate_org_cache() after creating an organization or changing one's name or is_active.
+ORG_CACHE_TTL = int(os.getenv("ORG_CACHE_TTL", "60"))
+_ORG_CACHE = TTLCache(maxsize=2048, ttl=ORG_CACHE_TTL)
+_ORG_LIST_CACHE = TTLCache(maxsize=1, ttl=ORG_CACHE_TTL)
+_ORG_CACHE_LOCK = threading.Lock()
+
+async def get_active_org_name(db: AsyncSession, organization_id: uuid.UUID) -> str | None:
+    """Name of the organization if it exists and is active, else None. Only active hits are cached."""
+    with _ORG_CACHE_LOCK:
+        name = _ORG_CACHE.get(organization_id)
+    if name is not None:
+        return name
+
+    name = await db.scalar(_STMT_ACTIVE_ORG_NAME, {"org_id": organization_id})
+    if name is not None:
+        with _ORG_CACHE_LOCK:
+            _ORG_CACHE[organization_id] = name
+    return name
+
+def invalidate_org_cache(organization_id: uuid.UUID | None = None) -> None:
+    with _ORG_CACHE_LOCK:
+        _ORG_LIST_CACHE.clear()
+        if organization_id is not None:
+            _ORG_CACHE.pop(organization_id, None)
+
+# User ids that just came back 404, keyed by (lookup, user_id), so repeated probes for ids that
+# don't exist skip the DB for a moment. New users get fresh uuid4 ids and can never be in here;
+# call invalidate_missing_users() after reactivating users.
+_MISSING_USER_CACHE = TTLCache(maxsize=8192, ttl=2)
+_MISSING_USER_LOCK = threading.Lock()
+
+def _user_known_missing(lookup: str, user_id: uuid.UUID) -> bool:
+    with _MISSING_USER_LOCK:
+        return (lookup, user_id) in _MISSING_USER_CACHE
+
+def _remember_missing_user(lookup: str, user_id: uuid.UUID) -> None:
+    with _MISSING_USER_LOCK:
+        _MISSING_USER_CACHE[(lookup, user_id)] = True
+
+def invalidate_missing_users() -> None:
+    with _MISSING_USER_LOCK:
+        _MISSING_USER_CACHE.clear()
 
 # =========================================================
 # Routes
 # =========================================================
 
+# The list routes below return ORJSONResponse directly, skipping response_model validation and
+# stdlib json (response_model stays for the docs). Nothing coerces their values on the way out, so
+# each dict is built from plain str/int/None: orjson rejects driver types such as asyncpg's UUID.
+
 @router.get("/organizations", response_model=List[OrganizationResponse])
-def get_organizations(db: Session = Depends(get_db)):
-    """Get all active organizations (for dropdowns)."""
-    try:
-        organizations = db.query(Organization).filter(Organization.is_active == True).all()
-        return [
-            OrganizationResponse(
-                id=org.id,
-                name=org.name,
-                description=org.description
+async def get_organizations(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Get all active organizations (for dropdowns). Supports If-None-Match revalidation."""
+    with _ORG_CACHE_LOCK:
+        cached = _ORG_LIST_CACHE.get("all")
+    if cached is None:
+        try:
+            organizations = (await db.execute(
+                select(Organization.id, Organization.name, Organization.description)
+                .where(Organization.is_active == True)
+            )).all()
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error: {str(e)}"
             )
+        body = orjson.dumps([
+            {
+                "id": str(org.id),
+                "name": org.name,
+                "description": org.description,
+                "user_count": 0,
+                "admin_count": 0,
+            }
             for org in organizations
-        ]
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Database error: {str(e)}"
-        )
+        ])
+        cached = (body, '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest())
+        with _ORG_CACHE_LOCK:
+            _ORG_LIST_CACHE["all"] = cached
+
+    body, etag = cached
+    # Browsers revalidate every time (a new org shows up at once) and get a bodiless 304 if unchanged
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.post("/register", response_model=AdminRegisterResponse)
-def register_admin(request: AdminRegisterRequest, db: Session = Depends(get_db)):
-    """Register a new admin user."""
-    # Username unique
-    existing_user = db.query(User).filter(User.username == request.username).first()
-    if existing_user:
+async def register_admin(
+    request: AdminRegisterRequest,
+    background_tasks: BackgroundTasks,
+    admin: dict = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Register another admin for the calling admin's organization (first admins come from the super-admin)."""
+    if str(request.organization_id) != admin["org"]:
+        raise HTTPException(status_code=403, detail="Cannot register admins for another organization")
+    await _ensure_admin_active(db, admin)
+    # Username unique, org exists and active, email unique (active)
+    checks = await _check_new_account(db, request.username, request.organization_id, request.email)
+    if checks.username_taken:
         raise HTTPException(status_code=400, detail="Username already exists")
-
-    # Org exists and active
-    organization = (
-        db.query(Organization)
-        .filter(Organization.id == request.organization_id, Organization.is_active == True)
-        .first()
-    )
-    if not organization:
+    if checks.organization_name is None:
         raise HTTPException(status_code=404, detail="Organization not found")
+    if checks.email_taken:
+        raise HTTPException(status_code=400, detail="Email already exists")
+    organization_name = checks.organization_name
 
-    # Email unique (active)
-    if request.email:
-        dup = (
-            db.query(User)
-            .filter(User.email != None)
-            .filter(User.is_active == True)
-            .filter(User.email.ilike(request.email))
-            .first()
-        )
-        if dup:
-            raise HTTPException(status_code=400, detail="Email already exists")
+    # End the read transaction so the pooled connection isn't held while the hash runs
+    await db.commit()
 
     # Password: provided or temp
-    plain_password = request.password or generate_temp_password()
-    password_hash = hash_password(plain_password)
+    if request.password:
+        plain_password = request.password
+        password_hash = await hash_password_async(plain_password)
+    else:
+        plain_password = generate_temp_password()
+        password_hash = await hash_password_async(plain_password, category="temp")
 
     # Create admin
     new_admin = User(
@@ -169,55 +759,57 @@ def register_admin(request: AdminRegisterRequest, db: Session = Depends(get_db))
     )
 
     try:
+        # id is a client-side uuid4 default and the session doesn't expire on commit: no refresh needed
         db.add(new_admin)
-        db.commit()
-        db.refresh(new_admin)
+        await db.commit()
 
-        # Email credentials if email provided
+        # Email credentials after the response is sent
         if request.email:
-            try:
-                login_url = f"{APP_BASE_URL}/change-password?user_id={new_admin.id}"
-                html = f"""
-                <div style="font-family:Segoe UI,Roboto,Arial,sans-serif;font-size:14px;color:#111;">
-                  <h2 style="margin:0 0 12px;">Your Admin Account</h2>
-                  <p>Hello {request.username},</p>
-                  <p>Your admin account has been created for <b>{organization.name}</b>.</p>
-                  <p><b>Username:</b> {request.username}<br/>
-                     <b>Temporary Password:</b> <code style="font-size:16px;">{plain_password}</code></p>
-                  <p>Please <a href="{login_url}" style="color:#6c2bd9;">change your password</a> before your first login. After changing, sign in normally.</p>
-                  <hr style="border:none;border-top:1px solid #eee;margin:16px 0;" />
-                  <p style="color:#555;">If you didn’t expect this email, you can ignore it.</p>
-                </div>
-                """
-                send_email(
-                    to_email=request.email,
-                    subject="Your Admin Account Credentials",
-                    html_body=html,
-                )
-            except Exception as e:
-                print(f"Failed to send email: {e}")
-
-        return AdminRegisterResponse(
+            html = render_account_email(
+                username=request.username,
+                organization_name=organization_name,
+                plain_password=plain_password,
+                user_id=new_admin.id,
+                is_admin=True,
+            )
+            background_tasks.add_task(
+                send_email_background,
+                to_email=request.email,
+                subject="Your Admin Account Credentials",
+                html_body=html,
+            )
+
+        # Values are already validated/DB-issued; response_model checks the output once anyway
+        return AdminRegisterResponse.model_construct(
             message="Admin registered successfully",
             user_id=new_admin.id,
             username=new_admin.username,
-            organization_name=organization.name,
+            organization_name=organization_name,
         )
 
+    except IntegrityError as e:
+        await db.rollback()
+        conflict = _conflict_detail(e)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+        raise HTTPException(status_code=500, detail=f"Failed to register admin: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to register admin: {str(e)}"
         )
 
 @router.post("/login")
-def admin_login(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
+async def admin_login(username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
     """Login for admin users (Form data)."""
-    user = db.query(User).filter(User.username == username, User.is_active == True).first()
-    if not user or not verify_password(password, user.password_hash):
+    user = await db.scalar(_STMT_USER_BY_USERNAME, {"username": username})
+    # End the read transaction so the pooled connection isn't held while the hash runs
+    await db.commit()
+    if not await verify_user_password_async(user, password):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
+    # Checked after the verify, so only a caller with the right password learns the role
     if user.role != "admin":
         raise HTTPException(status_code=403, detail="Access denied. Admin privileges required.")
 
@@ -233,79 +825,92 @@ def admin_login(username: str = Form(...), password: str = Form(...), db: Sessio
             }
         )
 
-    organization = (
-        db.query(Organization)
-        .filter(Organization.id == user.organization_id, Organization.is_active == True)
-        .first()
-    )
-    if not organization:
+    organization_name = await get_active_org_name(db, user.organization_id)
+    if organization_name is None:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
+    await upgrade_password_hash(db, user, password)
+
     return {
         "message": "Login successful",
+        "access_token": issue_access_token(user),
+        "token_type": "bearer",
         "user_id": user.id,
         "username": user.username,
         "role": user.role,
         "organization_id": user.organization_id,
-        "organization_name": organization.name if organization else None,
+        "organization_name": organization_name,
         "created_at": user.created_at,
     }
 
 @router.get("/profile/{user_id}")
-def get_admin_profile(user_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_admin_profile(user_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get admin user profile."""
-    user = db.query(User).filter(User.id == user_id, User.role == "admin", User.is_active == True).first()
-    if not user:
+    if _user_known_missing("admin", user_id):
+        raise HTTPException(status_code=404, detail="Admin user not found")
+    # Organization name joined in (NULL if the org is inactive) instead of a second SELECT
+    result = await db.execute(
+        select(
+            User.id,
+            User.username,
+            User.role,
+            User.organization_id,
+            User.created_at,
+            Organization.name.label("organization_name"),
+        )
+        .outerjoin(Organization, and_(Organization.id == User.organization_id, Organization.is_active == True))
+        .where(User.id == user_id, User.role == "admin", User.is_active == True)
+    )
+    profile = result.first()
+    if not profile:
+        _remember_missing_user("admin", user_id)
         raise HTTPException(status_code=404, detail="Admin user not found")
-
-    organization = db.query(Organization).filter(Organization.id == user.organization_id, Organization.is_active == True).first()
 
     return {
-        "user_id": user.id,
-        "username": user.username,
-        "role": user.role,
-        "organization_id": user.organization_id,
-        "organization_name": organization.name if organization else None,
-        "created_at": user.created_at,
+        "user_id": profile.id,
+        "username": profile.username,
+        "role": profile.role,
+        "organization_id": profile.organization_id,
+        "organization_name": profile.organization_name,
+        "created_at": profile.created_at,
     }
 
 @router.post("/create-user", response_model=AdminRegisterResponse)
-def create_user(request: CreateUserRequest, db: Session = Depends(get_db)):
+async def create_user(
+    request: CreateUserRequest,
+    background_tasks: BackgroundTasks,
+    admin: dict = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     Create a new regular user. Admins can only create 'user' roles (security).
     """
     if request.role != "user":
         raise HTTPException(status_code=403, detail="Admins can only create regular users")
+    if str(request.organization_id) != admin["org"]:
+        raise HTTPException(status_code=403, detail="Admins can only create users in their own organization")
+    await _ensure_admin_active(db, admin)
 
-    # Unique username
-    existing_user = db.query(User).filter(User.username == request.username).first()
-    if existing_user:
+    # Unique username, org exists, email unique (active)
+    checks = await _check_new_account(db, request.username, request.organization_id, request.email)
+    if checks.username_taken:
         raise HTTPException(status_code=400, detail="Username already exists")
-
-    # Org exists
-    organization = (
-        db.query(Organization)
-        .filter(Organization.id == request.organization_id, Organization.is_active == True)
-        .first()
-    )
-    if not organization:
+    if checks.organization_name is None:
         raise HTTPException(status_code=404, detail="Organization not found")
+    if checks.email_taken:
+        raise HTTPException(status_code=400, detail="Email already exists")
+    organization_name = checks.organization_name
 
-    # Email unique (active)
-    if request.email:
-        dup = (
-            db.query(User)
-            .filter(User.email != None)
-            .filter(User.is_active == True)
-            .filter(User.email.ilike(request.email))
-            .first()
-        )
-        if dup:
-            raise HTTPException(status_code=400, detail="Email already exists")
+    # End the read transaction so the pooled connection isn't held while the hash runs
+    await db.commit()
 
     # Password: provided or temp
-    plain_password = request.password or generate_temp_password()
-    password_hash = hash_password(plain_password)
+    if request.password:
+        plain_password = request.password
+        password_hash = await hash_password_async(plain_password)
+    else:
+        plain_password = generate_temp_password()
+        password_hash = await hash_password_async(plain_password, category="temp")
 
     # Create user (force role to 'user')
     new_user = User(
@@ -319,54 +924,53 @@ def create_user(request: CreateUserRequest, db: Session = Depends(get_db)):
 
     try:
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
 
         if request.email:
-            try:
-                login_url = f"{APP_BASE_URL}/change-password?user_id={new_user.id}"
-                html = f"""
-                <div style="font-family:Segoe UI,Roboto,Arial,sans-serif;font-size:14px;color:#111;">
-                  <h2 style="margin:0 0 12px;">Your Account</h2>
-                  <p>Hello {request.username},</p>
-                  <p>Your account has been created for <b>{organization.name}</b>.</p>
-                  <p><b>Username:</b> {request.username}<br/>
-                     <b>Temporary Password:</b> <code style="font-size:16px;">{plain_password}</code></p>
-                  <p>Please <a href="{login_url}" style="color:#6c2bd9;">change your password</a> before your first login. After changing, sign in normally.</p>
-                  <hr style="border:none;border-top:1px solid #eee;margin:16px 0;" />
-                  <p style="color:#555;">If you didn’t expect this email, you can ignore it.</p>
-                </div>
-                """
-                send_email(
-                    to_email=request.email,
-                    subject="Your Account Credentials",
-                    html_body=html,
-                )
-            except Exception as e:
-                print(f"Failed to send email: {e}")
-
-        return AdminRegisterResponse(
+            html = render_account_email(
+                username=request.username,
+                organization_name=organization_name,
+                plain_password=plain_password,
+                user_id=new_user.id,
+                is_admin=False,
+            )
+            background_tasks.add_task(
+                send_email_background,
+                to_email=request.email,
+                subject="Your Account Credentials",
+                html_body=html,
+            )
+
+        return AdminRegisterResponse.model_construct(
             message="User created successfully",
             user_id=new_user.id,
             username=new_user.username,
-            organization_name=organization.name,
+            organization_name=organization_name,
         )
 
+    except IntegrityError as e:
+        await db.rollback()
+        conflict = _conflict_detail(e)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+        raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create user: {str(e)}"
         )
 
 @router.post("/user/login")
-def user_login(request: UserLoginRequest, db: Session = Depends(get_db)):
+async def user_login(request: UserLoginRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Login for users (JSON body).
     Returns 403 with must_change_password=True if a forced change is required.
     """
-    user = db.query(User).filter(User.username == request.username, User.is_active == True).first()
-    if not user or not verify_password(request.password, user.password_hash):
+    user = await db.scalar(_STMT_USER_BY_USERNAME, {"username": request.username})
+    # End the read transaction so the pooled connection isn't held while the hash runs
+    await db.commit()
+    if not await verify_user_password_async(user, request.password):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
     if getattr(user, "must_change_password", False):
@@ -380,32 +984,40 @@ def user_login(request: UserLoginRequest, db: Session = Depends(get_db)):
             }
         )
 
-    organization = (
-        db.query(Organization)
-        .filter(Organization.id == user.organization_id, Organization.is_active == True)
-        .first()
-    )
-    if not organization:
+    organization_name = await get_active_org_name(db, user.organization_id)
+    if organization_name is None:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
+    await upgrade_password_hash(db, user, request.password)
+
     return {
         "message": "Login successful",
+        "access_token": issue_access_token(user),
+        "token_type": "bearer",
         "user_id": user.id,
         "username": user.username,
         "role": user.role,
         "organization_id": user.organization_id,
-        "organization_name": organization.name if organization else None,
+        "organization_name": organization_name,
         "created_at": user.created_at,
     }
 
 @router.get("/organization-users/{org_id}")
-def get_org_users_admin(org_id: uuid.UUID, db: Session = Depends(get_db)):
-    """Get all active users in a specific organization."""
-    organization = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
-    if not organization:
+async def get_org_users_admin(
+    org_id: uuid.UUID,
+    response: Response,
+    after: uuid.UUID | None = None,
+    limit: int = Query(200, ge=1, le=USERS_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get active users in a specific organization, one page at a time (next page id in X-Next-Cursor)."""
+    # Only the columns in the response; skips password_hash/email hydration
+    users, next_cursor = await _active_users_page(db, org_id, after, limit)
+    # The org check only costs a query when the page comes back empty
+    if not users and not await _org_is_active(db, org_id):
         raise HTTPException(status_code=404, detail="Organization not found")
-
-    users = db.query(User).filter(User.organization_id == org_id, User.is_active == True).all()
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         {
             "id": str(user.id),
@@ -417,216 +1029,227 @@ def get_org_users_admin(org_id: uuid.UUID, db: Session = Depends(get_db)):
     ]
 
 @router.delete("/delete-user/{user_id}")
-def delete_user(user_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_user(user_id: uuid.UUID, admin: dict = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
     """Soft-deactivate a user (cannot delete last admin in org)."""
-    user_to_delete = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    await _ensure_admin_active(db, admin)
+    if _user_known_missing("active", user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    user_to_delete = await _user_for_deactivation(db, user_id)
     if not user_to_delete:
+        _remember_missing_user("active", user_id)
         raise HTTPException(status_code=404, detail="User not found")
+    if str(user_to_delete.organization_id) != admin["org"]:
+        raise HTTPException(status_code=403, detail="User does not belong to your organization")
 
     # Prevent deleting the last admin of an org
-    if user_to_delete.role == "admin":
-        admin_count = (
-            db.query(User)
-            .filter(
-                User.organization_id == user_to_delete.organization_id,
-                User.role == "admin",
-                User.is_active == True,
-            )
-            .count()
-        )
-        if admin_count <= 1:
-            raise HTTPException(status_code=400, detail="Cannot delete the last admin in the organization")
-
-    try:
-        user_to_delete.is_active = False
-        db.commit()
+    if user_to_delete.role == "admin" and user_to_delete.admin_count <= 1:
+        raise HTTPException(status_code=400, detail="Cannot delete the last admin in the organization")
 
-        verification = db.query(User).filter(User.id == user_id).first()
-        if verification and verification.is_active:
-            print(f"Warning: user {user_to_delete.username} still active after deletion attempt")
-        else:
-            print(f"Verification: user {user_to_delete.username} successfully deactivated")
-
-        return {
-            "message": f"User {user_to_delete.username} deactivated successfully",
-            "user_id": str(user_id),
-            "username": user_to_delete.username,
-            "organization_id": str(user_to_delete.organization_id),
-        }
+    username = user_to_delete.username
+    organization_id = user_to_delete.organization_id
 
+    try:
+        updated = await _deactivate_user(db, user_id)
+        await db.commit()
     except Exception as e:
-        db.rollback()
-        error_msg = str(e)
-        # Provide a friendlier message for common DB errors
-        if "foreign key constraint" in error_msg.lower():
-            detail = "Cannot delete user due to remaining references. Please contact support."
-        elif "permission" in error_msg.lower():
-            detail = "Permission denied. You may not have the right to delete this user."
-        elif "unique constraint" in error_msg.lower():
-            detail = "Database constraint violation. Please contact support."
-        elif "connection" in error_msg.lower():
-            detail = "Database connection error. Please try again."
-        elif "timeout" in error_msg.lower():
-            detail = "Database operation timed out. Please try again."
-        elif "deadlock" in error_msg.lower():
-            detail = "Database deadlock detected. Please try again."
-        else:
-            detail = f"Failed to delete user: {error_msg}"
-
-        print(f"Detailed error during user deletion: {error_msg}")
-        print(f"Error type: {type(e).__name__}")
-        print(f"User being deleted: {user_to_delete.username if user_to_delete else 'Unknown'}")
-        print(f"User ID: {user_id}")
+        await db.rollback()
+        detail = _deactivate_error_detail(e)
+        logger.exception("Failed to deactivate user %s (%s)", username, user_id)
 
         raise HTTPException(status_code=500, detail=detail)
 
+    # Lost a race: another request deactivated this user, or the org's other admin(s)
+    if not updated:
+        if user_to_delete.role == "admin":
+            raise HTTPException(status_code=400, detail="Cannot delete the last admin in the organization")
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {
+        "message": f"User {username} deactivated successfully",
+        "user_id": str(user_id),
+        "username": username,
+        "organization_id": str(organization_id),
+    }
+
 # ---------------- Super Admin ----------------
 
 @router.post("/super-admin/login")
-def super_admin_login(request: SuperAdminLogin, db: Session = Depends(get_db)):
+async def super_admin_login(request: SuperAdminLogin, db: AsyncSession = Depends(get_async_db)):
     """Login for super-admin users (JSON)."""
-    super_admin = db.query(SuperAdmin).filter(SuperAdmin.username == request.username).first()
-    if not super_admin or not verify_password(request.password, super_admin.password_hash):
+    super_admin = await db.scalar(_STMT_SUPER_ADMIN_BY_USERNAME, {"username": request.username})
+    # End the read transaction so the pooled connection isn't held while the hash runs
+    await db.commit()
+    if not await verify_user_password_async(super_admin, request.password):
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
+    await upgrade_password_hash(db, super_admin, request.password)
+
     return {
         "message": "Login successful",
+        "access_token": issue_super_admin_token(super_admin),
+        "token_type": "bearer",
         "user_id": super_admin.id,
         "username": super_admin.username,
         "role": "super-admin",
         "created_at": super_admin.created_at,
     }
 
-@router.post("/super-admin/register")
-def register_super_admin(request: SuperAdminCreate, db: Session = Depends(get_db)):
-    """Register a new super-admin user (initial setup)."""
-    existing_user = db.query(SuperAdmin).filter(SuperAdmin.username == request.username).first()
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Username already exists")
-
-    password_hash = hash_password(request.password)
+@router.post("/super-admin/register", dependencies=[Depends(require_super_admin)])
+async def register_super_admin(request: SuperAdminCreate, db: AsyncSession = Depends(get_async_db)):
+    """Register another super-admin (the first one comes from setup_super_admin.py)."""
+    # No pre-check: the unique username constraint rejects duplicates atomically
+    password_hash = await hash_password_async(request.password, category="bootstrap")
     new_super_admin = SuperAdmin(username=request.username, password_hash=password_hash)
 
     try:
         db.add(new_super_admin)
-        db.commit()
-        db.refresh(new_super_admin)
+        await db.commit()
         return {
             "message": "Super-admin registered successfully",
             "user_id": new_super_admin.id,
             "username": new_super_admin.username,
         }
+    except IntegrityError as e:
+        await db.rollback()
+        conflict = _conflict_detail(e)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+        raise HTTPException(status_code=500, detail=f"Failed to register super-admin: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to register super-admin: {str(e)}")
 
 @router.get("/super-admin/organizations", response_model=List[OrganizationResponse])
-def get_all_organizations(db: Session = Depends(get_db)):
+async def get_all_organizations(db: AsyncSession = Depends(get_async_db)):
     """Get all organizations with user/admin counts for super-admin."""
     try:
-        organizations = db.query(Organization).filter(Organization.is_active == True).all()
-        result = []
-        for org in organizations:
-            user_count = db.query(User).filter(User.organization_id == org.id, User.is_active == True).count()
-            admin_count = db.query(User).filter(
-                User.organization_id == org.id, User.role == "admin", User.is_active == True
-            ).count()
-            result.append(
-                OrganizationResponse(
-                    id=org.id,
-                    name=org.name,
-                    description=org.description,
-                    user_count=user_count,
-                    admin_count=admin_count,
-                )
+        # One GROUP BY instead of two COUNT queries per organization
+        rows = (await db.execute(
+            select(
+                Organization.id,
+                Organization.name,
+                Organization.description,
+                func.count(User.id).label("user_count"),
+                func.count(case((User.role == "admin", User.id))).label("admin_count"),
             )
-        return result
+            .outerjoin(User, and_(User.organization_id == Organization.id, User.is_active == True))
+            .where(Organization.is_active == True)
+            .group_by(Organization.id)
+        )).all()
+        return ORJSONResponse([
+            {
+                "id": str(row.id),
+                "name": row.name,
+                "description": row.description,
+                "user_count": int(row.user_count),
+                "admin_count": int(row.admin_count),
+            }
+            for row in rows
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.post("/super-admin/organizations", response_model=dict)
-def create_organization(payload: OrgCreate, db: Session = Depends(get_db)):
+@router.post("/super-admin/organizations", response_model=dict, dependencies=[Depends(require_super_admin)])
+async def create_organization(payload: OrgCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new organization (super-admin)."""
     try:
-        org = Organization(name=payload.name, description=payload.description)
-        db.add(org)
-        db.commit()
-        db.refresh(org)
-        return {"id": org.id, "name": org.name, "message": "Organization created successfully"}
+        # Generate the id here so the response is built from values already in hand
+        org_id = uuid.uuid4()
+        db.add(Organization(id=org_id, name=payload.name, description=payload.description))
+        await db.commit()
+        invalidate_org_cache()
+        return {"id": org_id, "name": payload.name, "message": "Organization created successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to create organization: {str(e)}")
 
-@router.delete("/super-admin/organizations/{org_id}")
-def delete_organization(org_id: uuid.UUID, db: Session = Depends(get_db)):
+@router.delete("/super-admin/organizations/{org_id}", dependencies=[Depends(require_super_admin)])
+async def delete_organization(org_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Soft-delete an organization and deactivate all its users (super-admin)."""
     try:
-        org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
-        if not org:
-            raise HTTPException(status_code=404, detail="Organization not found or already inactive")
-
-        # Deactivate all users first
-        db.query(User).filter(User.organization_id == org_id, User.is_active == True).update(
-            {User.is_active: False}, synchronize_session=False
+        # One statement: flip the org (reading its name), then deactivate its users only if the
+        # org row actually changed. No preliminary SELECT to race with, one round trip.
+        org_off = (
+            update(Organization)
+            .where(Organization.id == org_id, Organization.is_active == True)
+            .values(is_active=False)
+            .returning(Organization.id, Organization.name)
+            .cte("org_off")
         )
+        users_off = (
+            update(User)
+            .where(User.organization_id.in_(select(org_off.c.id)), User.is_active == True)
+            .values(is_active=False)
+            .returning(User.id)
+            .cte("users_off")
+        )
+        org_name = await db.scalar(select(org_off.c.name).add_cte(users_off))
+        if org_name is None:
+            raise HTTPException(status_code=404, detail="Organization not found or already inactive")
 
-        org.is_active = False
-        db.commit()
-        return {"message": f"Organization '{org.name}' deactivated successfully"}
+        await db.commit()
+        invalidate_org_cache(org_id)
+        return {"message": f"Organization '{org_name}' deactivated successfully"}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to deactivate organization: {str(e)}")
 
 @router.get("/super-admin/organizations/{org_id}/users", response_model=List[UserResponse])
-def get_organization_users_super_admin(org_id: uuid.UUID, db: Session = Depends(get_db)):
-    """Get all users in a specific organization (super-admin view)."""
+async def get_organization_users_super_admin(
+    org_id: uuid.UUID,
+    after: uuid.UUID | None = None,
+    limit: int = Query(200, ge=1, le=USERS_PAGE_MAX),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get users in a specific organization, one page at a time (super-admin view)."""
     try:
-        organization = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
-        if not organization:
+        users, next_cursor = await _active_users_page(db, org_id, after, limit)
+        if not users and not await _org_is_active(db, org_id):
             raise HTTPException(status_code=404, detail="Organization not found")
 
-        users = db.query(User).filter(User.organization_id == org_id, User.is_active == True).all()
-
-        return [
-            UserResponse(
-                id=user.id,
-                username=user.username,
-                role=user.role,
-                organization_id=user.organization_id,
-                organization_name=organization.name,
-                created_at=str(user.created_at),
-            )
+        return ORJSONResponse([
+            {
+                "id": str(user.id),
+                "username": user.username,
+                "role": user.role,
+                "organization_id": str(org_id),
+                "organization_name": user.organization_name,
+                "created_at": str(user.created_at),
+                "email": None,
+            }
             for user in users
-        ]
+        ], headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.post("/super-admin/organizations/{org_id}/admins", response_model=dict)
-def add_admin_to_organization(org_id: uuid.UUID, request: UserCreate, db: Session = Depends(get_db)):
+@router.post("/super-admin/organizations/{org_id}/admins", response_model=dict, dependencies=[Depends(require_super_admin)])
+async def add_admin_to_organization(org_id: uuid.UUID, request: UserCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     """Add an admin to an organization (super-admin)."""
     try:
-        organization = db.query(Organization).filter(Organization.id == org_id).first()
-        if not organization:
+        checks = await _check_new_account(
+            db, request.username, org_id, request.email, active_org_only=False
+        )
+        if checks.organization_name is None:
             raise HTTPException(status_code=404, detail="Organization not found")
-
-        existing_user = db.query(User).filter(User.username == request.username).first()
-        if existing_user:
+        if checks.username_taken:
             raise HTTPException(status_code=400, detail="Username already exists")
+        if checks.email_taken:
+            raise HTTPException(status_code=400, detail="Email already exists")
+        organization_name = checks.organization_name
 
-        # Email unique (active)
-        if request.email:
-            dup = (
-                db.query(User)
-                .filter(User.email != None)
-                .filter(User.is_active == True)
-                .filter(User.email.ilike(request.email))
-                .first()
-            )
-            if dup:
-                raise HTTPException(status_code=400, detail="Email already exists")
-
-        plain_password = request.password or generate_temp_password()
-        password_hash = hash_password(plain_password)
+        # End the read transaction so the pooled connection isn't held while the hash runs
+        await db.commit()
+        if request.password:
+            plain_password = request.password
+            password_hash = await hash_password_async(plain_password)
+        else:
+            plain_password = generate_temp_password()
+            password_hash = await hash_password_async(plain_password, category="temp")
 
         new_admin = User(
             username=request.username,
@@ -638,75 +1261,74 @@ def add_admin_to_organization(org_id: uuid.UUID, request: UserCreate, db: Sessio
         )
 
         db.add(new_admin)
-        db.commit()
-        db.refresh(new_admin)
+        await db.commit()
 
         if request.email:
-            try:
-                login_url = f"{APP_BASE_URL}/change-password?user_id={new_admin.id}"
-                html = f"""
-                <div style="font-family:Segoe UI,Roboto,Arial,sans-serif;font-size:14px;color:#111;">
-                  <h2 style="margin:0 0 12px;">Your Admin Account</h2>
-                  <p>Hello {request.username},</p>
-                  <p>Your admin account has been created for <b>{organization.name}</b>.</p>
-                  <p><b>Username:</b> {request.username}<br/>
-                     <b>Temporary Password:</b> <code style="font-size:16px;">{plain_password}</code></p>
-                  <p>Please <a href="{login_url}" style="color:#6c2bd9;">change your password</a> before your first login. After changing, sign in normally.</p>
-                  <hr style="border:none;border-top:1px solid #eee;margin:16px 0;" />
-                  <p style="color:#555;">If you didn’t expect this email, you can ignore it.</p>
-                </div>
-                """
-                send_email(
-                    to_email=request.email,
-                    subject="Your Admin Account Credentials",
-                    html_body=html,
-                )
-            except Exception as e:
-                print(f"Failed to send email: {e}")
+            html = render_account_email(
+                username=request.username,
+                organization_name=organization_name,
+                plain_password=plain_password,
+                user_id=new_admin.id,
+                is_admin=True,
+            )
+            background_tasks.add_task(
+                send_email_background,
+                to_email=request.email,
+                subject="Your Admin Account Credentials",
+                html_body=html,
+            )
 
         return {
             "message": "Admin added successfully",
             "user_id": new_admin.id,
             "username": new_admin.username,
-            "organization_name": organization.name,
+            "organization_name": organization_name,
         }
 
+    except IntegrityError as e:
+        await db.rollback()
+        conflict = _conflict_detail(e)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+        raise HTTPException(status_code=500, detail=f"Failed to add admin: {str(e)}")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to add admin: {str(e)}")
 
-@router.delete("/super-admin/users/{user_id}")
-def delete_user_super_admin(user_id: uuid.UUID, db: Session = Depends(get_db)):
+@router.delete("/super-admin/users/{user_id}", dependencies=[Depends(require_super_admin)])
+async def delete_user_super_admin(user_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Soft-deactivate a user (super-admin, any org)."""
+    if _user_known_missing("active", user_id):
+        raise HTTPException(status_code=404, detail="User not found or already inactive")
     try:
-        user_to_delete = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        user_to_delete = await _user_for_deactivation(db, user_id)
         if not user_to_delete:
+            _remember_missing_user("active", user_id)
             raise HTTPException(status_code=404, detail="User not found or already inactive")
 
         # Prevent deactivation of last admin in an org
-        if user_to_delete.role == "admin":
-            admin_count = (
-                db.query(User)
-                .filter(
-                    User.organization_id == user_to_delete.organization_id,
-                    User.role == "admin",
-                    User.is_active == True,
-                )
-                .count()
-            )
-            if admin_count <= 1:
-                raise HTTPException(status_code=400, detail="Cannot deactivate the last admin in the organization")
+        if user_to_delete.role == "admin" and user_to_delete.admin_count <= 1:
+            raise HTTPException(status_code=400, detail="Cannot deactivate the last admin in the organization")
+
+        username = user_to_delete.username
+        organization_id = user_to_delete.organization_id
 
-        user_to_delete.is_active = False
-        db.commit()
+        updated = await _deactivate_user(db, user_id)
+        await db.commit()
+        if not updated:
+            if user_to_delete.role == "admin":
+                raise HTTPException(status_code=400, detail="Cannot deactivate the last admin in the organization")
+            raise HTTPException(status_code=404, detail="User not found or already inactive")
 
         return {
-            "message": f"User {user_to_delete.username} deactivated successfully",
+            "message": f"User {username} deactivated successfully",
             "user_id": str(user_id),
-            "username": user_to_delete.username,
-            "organization_id": str(user_to_delete.organization_id),
+            "username": username,
+            "organization_id": str(organization_id),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to deactivate user: {str(e)}")
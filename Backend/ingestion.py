@@ -3,17 +3,20 @@ import uuid
 import hashlib
 import re
 import io
+import logging
 from typing import List, Optional
 import pandas as pd
-from pypdf import PdfReader
 import docx
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from sentence_transformers import SentenceTransformer
 from models import Document, DocumentChunk
+from pdf_text import read_pdf
 
 # from FlagEmbedding import BGEM3FlagModel
 import numpy as np
 
+logger = logging.getLogger(__name__)
 
 EMBEDDING_MODEL = os.getenv(
     "EMBEDDING_MODEL",
@@ -23,19 +26,36 @@ EMBEDDING_MODEL = os.getenv(
 
 ST_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu").strip().lower() 
 ST_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))     
+# "onnx" / "openvino" need sentence-transformers>=3.2 with its [onnx] / [openvino] extra.
+# EMBEDDING_MODEL_FILE picks a quantized export inside the model dir, e.g.
+# onnx/model_qint8_avx512_vnni.onnx (written by export_dynamic_quantized_onnx_model).
+ST_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").strip().lower()
+ST_MODEL_FILE = os.getenv("EMBEDDING_MODEL_FILE", "").strip()
+
+def _load_model() -> SentenceTransformer:
+    if ST_BACKEND == "torch":
+        return SentenceTransformer(EMBEDDING_MODEL, device=ST_DEVICE)
+    model_kwargs = {"file_name": ST_MODEL_FILE} if ST_MODEL_FILE else None
+    return SentenceTransformer(
+        EMBEDDING_MODEL, device=ST_DEVICE, backend=ST_BACKEND, model_kwargs=model_kwargs
+    )
 
 _model: Optional[SentenceTransformer] = None
 try:
-    print(f"Loading embedding model: {EMBEDDING_MODEL} on device={ST_DEVICE}")
-    _model = SentenceTransformer(EMBEDDING_MODEL, device=ST_DEVICE)
-    print("Embedding model loaded successfully")
+    logger.info(
+        "Loading embedding model: %s on device=%s backend=%s", EMBEDDING_MODEL, ST_DEVICE, ST_BACKEND
+    )
+    _model = _load_model()
+    if ST_BACKEND == "torch" and ST_DEVICE.startswith("cuda"):
+        # fp16 weights: half the memory traffic and tensor-core matmuls; cosine ranking is unaffected
+        _model.half()
+    logger.info("Embedding model loaded successfully")
 except Exception as e:
     raise RuntimeError(f"Could not load embedding model: {e}")
 
 # ---------- File readers ----------
 def _read_pdf(path: str) -> str:
-    reader = PdfReader(path)
-    return "\n".join([(p.extract_text() or "") for p in reader.pages])
+    return read_pdf(path)
 
 def _read_docx(path: str) -> str:
     d = docx.Document(path)
@@ -45,19 +65,24 @@ def _read_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
-def _read_csv(path: str) -> str:
-    df = pd.read_csv(path)
+def _csv_rows_to_text(df: pd.DataFrame) -> str:
+    """One "col: value | col: value" line per row."""
     df = df.fillna("")
-    lines = []
-    for _, row in df.iterrows():
-        line = " | ".join(f"{col}: {row[col]}" for col in df.columns)
-        lines.append(line)
-    return "\n".join(lines)
+    columns = list(df.columns)
+    # Rows come from to_numpy(), the same array iterrows() builds its per-row Series from, so every
+    # value prints exactly as before (an all-numeric frame upcasts ints to "1.0") and the text,
+    # and with it content_hash, stays stable for CSVs that are already ingested.
+    return "\n".join(
+        " | ".join(f"{col}: {value}" for col, value in zip(columns, row))
+        for row in df.to_numpy()
+    )
+
+def _read_csv(path: str) -> str:
+    return _csv_rows_to_text(pd.read_csv(path))
 
 
 def _read_pdf_bytes(data: bytes) -> str:
-    reader = PdfReader(io.BytesIO(data))
-    return "\n".join([(p.extract_text() or "") for p in reader.pages])
+    return read_pdf(data)
 
 def _read_docx_bytes(data: bytes) -> str:
     d = docx.Document(io.BytesIO(data))
@@ -67,13 +92,7 @@ def _read_txt_bytes(data: bytes) -> str:
     return data.decode("utf-8", errors="ignore")
 
 def _read_csv_bytes(data: bytes) -> str:
-    df = pd.read_csv(io.BytesIO(data))
-    df = df.fillna("")
-    lines = []
-    for _, row in df.iterrows():
-        line = " | ".join(f"{col}: {row[col]}" for col in df.columns)
-        lines.append(line)
-    return "\n".join(lines)
+    return _csv_rows_to_text(pd.read_csv(io.BytesIO(data)))
 
 def extract_text(file_path: str, filetype: str) -> str:
     ft = (filetype or "").lower()
@@ -89,7 +108,7 @@ def extract_text(file_path: str, filetype: str) -> str:
 
 def extract_text_from_bytes(file_bytes: bytes, filetype: str) -> str:
     ft = (filetype or "").lower()
-    print(f"Extracting text from {ft} file ({len(file_bytes)} bytes)")
+    logger.debug("Extracting text from %s file (%d bytes)", ft, len(file_bytes))
     
     try:
         if ft == "pdf":
@@ -103,34 +122,30 @@ def extract_text_from_bytes(file_bytes: bytes, filetype: str) -> str:
         else:
             raise ValueError(f"Unsupported file type: {filetype}")
         
-        print(f"Extracted {len(text)} characters of text")
+        logger.debug("Extracted %d characters of text", len(text))
         if len(text.strip()) == 0:
-            print("Warning: Extracted text is empty")
+            logger.warning("Extracted text is empty")
         return text
     except Exception as e:
-        print(f"Error extracting text from {ft} file: {e}")
+        logger.exception("Error extracting text from %s file", ft)
         raise Exception(f"Failed to extract text from {ft} file: {e}")
 
 # ---------- Chunk & Embed ----------
 def chunk_text(text: str, max_chars: int = 800, overlap: int = 100) -> List[str]:
     text = (text or "").strip()
-    print(f"Chunking text of length {len(text)} with max_chars={max_chars}, overlap={overlap}")
+    logger.debug("Chunking text of length %d with max_chars=%d, overlap=%d", len(text), max_chars, overlap)
     
     if not text:
-        print("Warning: Empty text provided for chunking")
+        logger.warning("Empty text provided for chunking")
         return []
     
-    chunks, i, n = [], 0, len(text)
     step = max(1, max_chars - overlap)
+    # text is stripped once above; slices keep their edge whitespace rather than being
+    # re-stripped, and only all-blank windows (long whitespace runs in PDFs) are dropped
+    chunks = [text[i:i + max_chars] for i in range(0, len(text), step)]
+    chunks = [c for c in chunks if not c.isspace()]
     
-    while i < n:
-        end = min(i + max_chars, n)
-        piece = text[i:end].strip()
-        if piece:
-            chunks.append(piece)
-        i += step
-    
-    print(f"Created {len(chunks)} chunks")
+    logger.debug("Created %d chunks", len(chunks))
     return chunks
 
 # def _embed_passages_batch(texts: List[str]) -> List[List[float]]:
@@ -157,19 +172,23 @@ def chunk_text(text: str, max_chars: int = 800, overlap: int = 100) -> List[str]
 #         print(f"Error during embedding: {e}")
 #         raise Exception(f"Embedding failed: {e}")
 
-def _embed_passages_batch(texts: List[str]) -> List[List[float]]:
+def _embed_passages_batch(texts: List[str]) -> np.ndarray:
+    """(len(texts), dim) float32 array; pgvector binds the rows directly."""
     try:
-        print(f"Embedding {len(texts)} text chunks...")
+        logger.debug("Embedding %d text chunks", len(texts))
+        # encode() sorts its input by length and batches internally, so pass the whole slice and
+        # let ST_BATCH_SIZE bound each forward pass; similar-length batches need less padding
         vecs = _model.encode(
             texts,
-            batch_size=max(1, len(texts)),
+            batch_size=ST_BATCH_SIZE,
             normalize_embeddings=True,   # auto L2 normalize
+            convert_to_numpy=True,
+            show_progress_bar=False,
         )
-        result = vecs.tolist()
-        print(f"Successfully embedded {len(result)} chunks")
-        return result
+        logger.debug("Embedded %d chunks", len(vecs))
+        return vecs
     except Exception as e:
-        print(f"Error during embedding: {e}")
+        logger.exception("Error during embedding")
         raise Exception(f"Embedding failed: {e}")
 
 # def embed_query(question: str) -> List[float]:
@@ -244,15 +263,17 @@ def process_document(
     db.flush()  
     # Flush to obtain doc.id without committing the transaction yet
     db.flush()
+    # Kept in a local: the per-batch commits below expire doc, and re-reading doc.id would reload it
+    doc_id = doc.id
 
     chunks = chunk_text(text_all, max_chars=chunk_size, overlap=chunk_overlap)
     total = len(chunks)
     
-    print(f"Created {total} chunks from document")
+    logger.debug("Created %d chunks from document", total)
 
     if total == 0:
-        print("Warning: No chunks created from document")
-        return {"document_id": doc.id, "chunks": 0}
+        logger.warning("No chunks created from document")
+        return {"document_id": doc_id, "chunks": 0}
 
     try:
        
@@ -260,35 +281,29 @@ def process_document(
         for start in range(0, total, bs):
             end = min(start + bs, total)
             batch_texts = chunks[start:end]
-            print(f"Processing batch {start//embedding_batch_size + 1}: chunks {start+1}-{end}")
+            logger.debug("Processing batch %d: chunks %d-%d", start // embedding_batch_size + 1, start + 1, end)
             
             batch_vecs = _embed_passages_batch(batch_texts)
 
-            batch_objects: List[DocumentChunk] = [
-                DocumentChunk(
-                    id=uuid.uuid4(),
-                    document_id=doc.id,
-                    content=content,
-                    embedding=vec,
-                )
+            rows = [
+                {"id": uuid.uuid4(), "document_id": doc_id, "content": content, "embedding": vec}
                 for content, vec in zip(batch_texts, batch_vecs)
             ]
 
-            for i in range(0, len(batch_objects), insert_batch_size):
-                slice_objs = batch_objects[i : i + insert_batch_size]
-                if not slice_objs:
-                    continue
-                db.bulk_save_objects(slice_objs)
-                db.flush()
+            for i in range(0, len(rows), insert_batch_size):
+                slice_rows = rows[i : i + insert_batch_size]
+                # Core executemany of plain dicts: psycopg2 sends multi-row INSERT ... VALUES
+                # pages, and no ORM objects are built or tracked for the chunks
+                db.execute(insert(DocumentChunk), slice_rows)
                 db.commit()
-                print(f"Saved {len(slice_objs)} chunks to database")
+                logger.debug("Saved %d chunks to database", len(slice_rows))
     except Exception as e:
-        print(f"Error during chunk processing: {e}")
+        logger.exception("Error during chunk processing")
         # Rollback the document creation if chunking fails
         db.rollback()
         raise Exception(f"Failed to process document chunks: {e}")
 
-    return {"document_id": doc.id, "chunks": total}
+    return {"document_id": doc_id, "chunks": total}
 
 def process_document_from_bytes(
     db: Session,
@@ -324,45 +339,40 @@ def process_document_from_bytes(
     )
     db.add(doc)
     db.flush()
+    doc_id = doc.id
 
     chunks = chunk_text(text_all, max_chars=chunk_size, overlap=chunk_overlap)
     total = len(chunks)
     
-    print(f"Created {total} chunks from document")
+    logger.debug("Created %d chunks from document", total)
 
     if total == 0:
-        print("Warning: No chunks created from document")
-        return {"document_id": doc.id, "chunks": 0}
+        logger.warning("No chunks created from document")
+        return {"document_id": doc_id, "chunks": 0}
 
     try:
         for start in range(0, total, embedding_batch_size):
             end = min(start + embedding_batch_size, total)
             batch_texts = chunks[start:end]
-            print(f"Processing batch {start//embedding_batch_size + 1}: chunks {start+1}-{end}")
+            logger.debug("Processing batch %d: chunks %d-%d", start // embedding_batch_size + 1, start + 1, end)
             
             batch_vecs = _embed_passages_batch(batch_texts)
 
-            batch_objects: List[DocumentChunk] = [
-                DocumentChunk(
-                    id=uuid.uuid4(),
-                    document_id=doc.id,
-                    content=content,
-                    embedding=vec,
-                )
+            rows = [
+                {"id": uuid.uuid4(), "document_id": doc_id, "content": content, "embedding": vec}
                 for content, vec in zip(batch_texts, batch_vecs)
             ]
-            for i in range(0, len(batch_objects), insert_batch_size):
-                slice_objs = batch_objects[i : i + insert_batch_size]
-                if not slice_objs:
-                    continue
-                db.bulk_save_objects(slice_objs)
-                db.flush()
+            for i in range(0, len(rows), insert_batch_size):
+                slice_rows = rows[i : i + insert_batch_size]
+                # Core executemany of plain dicts: psycopg2 sends multi-row INSERT ... VALUES
+                # pages, and no ORM objects are built or tracked for the chunks
+                db.execute(insert(DocumentChunk), slice_rows)
                 db.commit()
-                print(f"Saved {len(slice_objs)} chunks to database")
+                logger.debug("Saved %d chunks to database", len(slice_rows))
     except Exception as e:
-        print(f"Error during chunk processing: {e}")
+        logger.exception("Error during chunk processing")
         
         db.rollback()
         raise Exception(f"Failed to process document chunks: {e}")
 
-    return {"document_id": doc.id, "chunks": total}
+    return {"document_id": doc_id, "chunks": total}
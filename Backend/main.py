@@ -1,5 +1,6 @@
 import os
 import uuid
+import logging
 from typing import List, Optional, Tuple
 from datetime import datetime, timedelta
 import re
@@ -8,7 +9,7 @@ import json
 
 from fastapi import FastAPI, Depends, UploadFile, File, Form, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, func, case, and_, exists
 import numpy as np
 from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -20,9 +21,10 @@ from schemas import (
     OrganizationResponse, UserResponse, FeedbackCreate, FeedbackResponse, FeedbackUpdate
 )
 from ingestion import process_document, process_document_from_bytes, embed_query
+from pdf_text import shutdown_pool as shutdown_pdf_pool
 from llm import get_gemini, make_prompt, rewrite_query_with_history, classify_message_llm,judge_answer_llm,make_unknown_reply_llm
 
-from admin_auth import router as admin_router
+from admin_auth import router as admin_router, invalidate_missing_users, invalidate_org_cache, require_super_admin
 
 from langdetect import detect
 
@@ -34,6 +36,10 @@ import io
 from fastapi.staticfiles import StaticFiles
 
 
+# WARNING by default so debug/info messages are never formatted in production; LOG_LEVEL=INFO shows mock emails
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Multi-Org RAG Backend")
 
 # Mount static folder (for images, css, js, etc.)
@@ -42,6 +48,7 @@ app.mount("/static", StaticFiles(directory="Frontend"), name="static")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(admin_router)
@@ -65,7 +72,7 @@ WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
 
 try:
     whisper_model = WhisperModel(WHISPER_MODEL_NAME, device=WHISPER_DEVICE, compute_type="int8")
-    print(f"Whisper loaded: {WHISPER_MODEL_NAME} on {WHISPER_DEVICE}")
+    logger.info("Whisper loaded: %s on %s", WHISPER_MODEL_NAME, WHISPER_DEVICE)
 except Exception as e:
     raise RuntimeError(f"Failed to load Whisper model: {e}")
 
@@ -195,14 +202,10 @@ def change_password(
        or not re.search(r"[!@#$%^&*(),.?\":{}|<>]", new_password):
         raise HTTPException(status_code=400, detail="Password does not meet complexity requirements")
 
-    # Lookup user
+    # Lookup user and verify current password; a missing user fails the same way as a wrong password
+    from admin_auth import verify_user_password, hash_password
     user = db.query(User).filter(User.id == user_uuid).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Verify current password
-    from admin_auth import verify_password, hash_password
-    if not verify_password(current_password, user.password_hash):
+    if not verify_user_password(user, current_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
     # Update password
@@ -278,21 +281,21 @@ def create_chat(payload: dict, db: Session = Depends(get_db)):
     if not user_id:
         raise HTTPException(status_code=400, detail="user_id is required")
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not db.query(exists().where(User.id == user_id)).scalar():
         raise HTTPException(status_code=404, detail="User not found")
 
     chat = Chat(user_id=user_id, title="New Chat")
     db.add(chat)
+    # The INSERT returns server defaults (created_at); read them before commit expires the instance
+    db.flush()
+    result = {"chat_id": str(chat.id), "title": chat.title, "created_at": chat.created_at.isoformat()}
     db.commit()
-    db.refresh(chat)
 
-    return {"chat_id": str(chat.id), "title": chat.title, "created_at": chat.created_at.isoformat()}
+    return result
 
 @app.get("/chats/{user_id}", response_class=JSONResponse)
 def get_user_chats(user_id: str, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if not db.query(exists().where(User.id == user_id)).scalar():
         raise HTTPException(status_code=404, detail="User not found")
 
     chats = db.query(Chat).filter(Chat.user_id == user_id).order_by(Chat.created_at.desc()).all()
@@ -421,7 +424,6 @@ def ask(payload: AskRequest, db: Session = Depends(get_db)):
 
     # 6) Embed & retrieve top-K chunks
     qvec = embed_query(standalone_query)
-    qvec_np = np.array(qvec, dtype=np.float32)
 
     top_k = int(os.getenv("RAG_TOP_K", "40"))
     rows = db.execute(
@@ -437,7 +439,7 @@ def ask(payload: AskRequest, db: Session = Depends(get_db)):
             ORDER BY dc.embedding <=> (:q)::vector
             LIMIT {top_k}
         """),
-        {"q": qvec_np.tolist(), "org": str(payload.org_id)}
+        {"q": qvec, "org": str(payload.org_id)}
     ).fetchall()
 
     # 6.a) No retrieved rows → ask LLM to produce a polite unknown reply (NO sources)
@@ -509,15 +511,19 @@ def ask(payload: AskRequest, db: Session = Depends(get_db)):
         ))
         
         try:
-            msg_count = db.query(ChatMessage).filter(ChatMessage.chat_id == chat.id).count()
-            if (msg_count == 0) or (not chat.title) or (chat.title.strip().lower() == "new chat"):
+            # Title checks first; the "chat has no earlier messages" probe is an EXISTS, not a full COUNT
+            if (
+                (not chat.title)
+                or (chat.title.strip().lower() == "new chat")
+                or not db.query(exists().where(ChatMessage.chat_id == chat.id)).scalar()
+            ):
                 chat.title = payload.question[:80]
         except Exception:
             pass
         db.commit()
-    except Exception as e:
+    except Exception:
         db.rollback()
-        print(f"Error persisting chat: {e}")
+        logger.exception("Error persisting chat")
 
     return AskResponse(answer=final_answer, sources=sources_to_return)
 
@@ -535,7 +541,7 @@ def upload_document(
         raise HTTPException(status_code=403, detail="User does not belong to this organization")
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can upload documents")
-    org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == org_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -546,7 +552,7 @@ def upload_document(
     if len(file_bytes) == 0:
         raise HTTPException(status_code=400, detail="Uploaded file is empty")
 
-    print(f"Processing upload: {file.filename} ({len(file_bytes)} bytes)")
+    logger.debug("Processing upload: %s (%d bytes)", file.filename, len(file_bytes))
 
     try:
         result = process_document_from_bytes(
@@ -557,15 +563,15 @@ def upload_document(
             filename=file.filename,
             filetype=filetype,
         )
-        print(f"Upload successful: {result}")
+        logger.debug("Upload successful: %s", result)
         return UploadResponse(**result)
     except ValueError as e:
         if str(e) == "DUPLICATE_DOCUMENT":
             raise HTTPException(status_code=409, detail="Duplicate document for this organization")
-        print(f"ValueError during upload: {e}")
+        logger.warning("Invalid document %s: %s", file.filename, e)
         raise HTTPException(status_code=400, detail=f"Invalid document: {e}")
     except Exception as e:
-        print(f"Error during upload: {e}")
+        logger.exception("Error during upload of %s", file.filename)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @app.get("/documents/{org_id}")
@@ -581,7 +587,7 @@ def list_documents(
         raise HTTPException(status_code=403, detail="User does not belong to this organization")
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can list documents")
-    org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == org_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -618,7 +624,7 @@ def delete_document(
         raise HTTPException(statuscode=403, detail="User does not belong to this organization")
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can delete documents")
-    org = db.query(Organization).filter(Organization.id == user.organization_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == user.organization_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -656,7 +662,7 @@ def rename_document(
         raise HTTPException(status_code=403, detail="Only admins can rename documents")
     
     # Check organization active
-    org = db.query(Organization).filter(Organization.id == user.organization_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == user.organization_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
     
@@ -725,23 +731,54 @@ def _ensure_indexes():
             END $$;
             """
         ))
+        # Case-insensitive email uniqueness among active users. Skipped (with a notice)
+        # if existing rows already collide, so startup never fails on legacy data.
+        conn.execute(text(
+            """
+            DO $$
+            BEGIN
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email_active_lower
+                ON users (lower(email))
+                WHERE is_active AND email IS NOT NULL;
+            EXCEPTION WHEN unique_violation THEN
+                RAISE NOTICE 'ux_users_email_active_lower not created: duplicate active emails exist';
+            END $$;
+            """
+        ))
+        # Per-organization listings, user/admin counts and the last-admin guard all filter
+        # on active users only; a partial index keeps inactive rows out of it.
+        conn.execute(text(
+            """
+            DROP INDEX IF EXISTS ix_users_org_role_active;
+            CREATE INDEX IF NOT EXISTS ix_users_org_role_where_active
+            ON users (organization_id, role)
+            WHERE is_active;
+            ANALYZE users;
+            """
+        ))
+
+@app.on_event("shutdown")
+def _stop_pdf_workers():
+    shutdown_pdf_pool()
 
 # ---------- Orgs/Users/Feedback ----------
 @app.post("/orgs", response_class=JSONResponse)
 def create_org(payload: OrgCreate, db: Session = Depends(get_db)):
     org = Organization(name=payload.name, description=payload.description)
     db.add(org)
+    db.flush()
+    result = {"id": str(org.id), "name": org.name}
     db.commit()
-    db.refresh(org)
-    return JSONResponse({"id": org.id, "name": org.name})
+    invalidate_org_cache()
+    return JSONResponse(result)
 
 @app.post("/users", response_class=JSONResponse)
 def create_user(payload: UserCreate, db: Session = Depends(get_db)):
     from admin_auth import hash_password
-    existing_user = db.query(User).filter(User.username == payload.username).first()
-    if existing_user:
+    username_taken = db.query(exists().where(User.username == payload.username)).scalar()
+    if username_taken:
         raise HTTPException(status_code=400, detail="Username already exists")
-    org = db.query(Organization).filter(Organization.id == payload.organization_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == payload.organization_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
     password_hash = hash_password(payload.password)
@@ -754,9 +791,10 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db)):
         must_change_password=False
     )
     db.add(user)
+    db.flush()
+    result = {"id": str(user.id), "username": user.username}
     db.commit()
-    db.refresh(user)
-    return JSONResponse({"id": user.id, "username": user.username})
+    return JSONResponse(result)
 
 @app.get("/users/{org_id}", response_class=JSONResponse)
 def get_org_users(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: Session = Depends(get_db)):
@@ -768,7 +806,7 @@ def get_org_users(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: Sessio
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view users")
     
-    org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == org_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -814,10 +852,9 @@ def create_feedback(payload: FeedbackCreate, db: Session = Depends(get_db)):
         comment=payload.comment,
     )
     db.add(feedback)
-    db.commit()
-    db.refresh(feedback)
+    db.flush()
 
-    return FeedbackResponse(
+    response = FeedbackResponse(
         id=feedback.id,
         chat_id=feedback.chat_id,
         message_id=feedback.message_id,
@@ -828,6 +865,8 @@ def create_feedback(payload: FeedbackCreate, db: Session = Depends(get_db)):
         seen_by_admin=feedback.seen_by_admin,
         created_at=feedback.created_at.isoformat(),
     )
+    db.commit()
+    return response
 
 @app.get("/feedbacks/{org_id}", response_model=List[FeedbackResponse])
 def get_feedbacks(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: Session = Depends(get_db)):
@@ -839,7 +878,7 @@ def get_feedbacks(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: Sessio
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view feedbacks")
     
-    org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == org_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -881,8 +920,7 @@ def update_feedback_seen(feedback_id: uuid.UUID, user_id: uuid.UUID = Query(...)
     
     feedback.seen_by_admin = True
     db.commit()
-    db.refresh(feedback)
-    return JSONResponse({"feedback_id": str(feedback.id), "seen_by_admin": feedback.seen_by_admin})
+    return JSONResponse({"feedback_id": str(feedback_id), "seen_by_admin": True})
 
 @app.get("/feedbacks/{org_id}/stats", response_class=JSONResponse)
 def get_feedback_stats(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: Session = Depends(get_db)):
@@ -894,7 +932,7 @@ def get_feedback_stats(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: S
     if (user.role or "").lower() != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view feedback stats")
     
-    org = db.query(Organization).filter(Organization.id == org_id, Organization.is_active == True).first()
+    org = db.query(Organization.id).filter(Organization.id == org_id, Organization.is_active == True).first()
     if not org:
         raise HTTPException(status_code=403, detail="Organization is inactive")
 
@@ -928,28 +966,37 @@ def get_feedback_stats(org_id: uuid.UUID, user_id: uuid.UUID = Query(...), db: S
 # === List ALL orgs (active + inactive) so the dashboard can show both ===
 @app.get("/admin/super-admin/organizations/all", response_class=JSONResponse)
 def sa_list_orgs_all(db: Session = Depends(get_db)):
-    orgs = db.query(Organization).order_by(Organization.name).all()
-    out = []
-    for org in orgs:
-        admin_count = db.query(User).filter(
-            User.organization_id == org.id, User.role == "admin", User.is_active == True
-        ).count()
-        user_count = db.query(User).filter(
-            User.organization_id == org.id, User.role == "user", User.is_active == True
-        ).count()
-        out.append({
-            "id": str(org.id),
-            "name": org.name,
-            "description": org.description,
-            "is_active": bool(org.is_active),
-            "admin_count": admin_count,
-            "user_count": user_count,
-        })
+    # One GROUP BY over active members instead of two COUNT queries per organization
+    rows = (
+        db.query(
+            Organization.id,
+            Organization.name,
+            Organization.description,
+            Organization.is_active,
+            func.count(case((User.role == "admin", User.id))).label("admin_count"),
+            func.count(case((User.role == "user", User.id))).label("user_count"),
+        )
+        .outerjoin(User, and_(User.organization_id == Organization.id, User.is_active == True))
+        .group_by(Organization.id)
+        .order_by(Organization.name)
+        .all()
+    )
+    out = [
+        {
+            "id": str(row.id),
+            "name": row.name,
+            "description": row.description,
+            "is_active": bool(row.is_active),
+            "admin_count": row.admin_count,
+            "user_count": row.user_count,
+        }
+        for row in rows
+    ]
     return JSONResponse(out)
 
 
 # === RESTORE an org AND all of its admins/users ===
-@app.post("/admin/super-admin/organizations/{org_id}/restore", response_class=JSONResponse)
+@app.post("/admin/super-admin/organizations/{org_id}/restore", response_class=JSONResponse, dependencies=[Depends(require_super_admin)])
 def sa_restore_org(org_id: uuid.UUID, db: Session = Depends(get_db)):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
@@ -967,19 +1014,22 @@ def sa_restore_org(org_id: uuid.UUID, db: Session = Depends(get_db)):
     )
 
     db.commit()
-    db.refresh(org)
+    invalidate_org_cache(org_id)
+    invalidate_missing_users()
 
     # Counts after restore (active members only)
-    admin_count = db.query(User).filter(
-        User.organization_id == org_id, User.role == "admin", User.is_active == True
-    ).count()
-    user_count = db.query(User).filter(
-        User.organization_id == org_id, User.role == "user", User.is_active == True
-    ).count()
+    admin_count, user_count = (
+        db.query(
+            func.count(case((User.role == "admin", User.id))),
+            func.count(case((User.role == "user", User.id))),
+        )
+        .filter(User.organization_id == org_id, User.is_active == True)
+        .one()
+    )
 
     return JSONResponse({
         "message": "Organization restored",
-        "id": str(org.id),
+        "id": str(org_id),
         "reactivated_members": int(reactivated_total),
         "admin_count": admin_count,
         "user_count": user_count,
@@ -987,7 +1037,7 @@ def sa_restore_org(org_id: uuid.UUID, db: Session = Depends(get_db)):
 
 
 # === (Optional) SOFT-DELETE an org AND deactivate all members (symmetry) ===
-@app.delete("/admin/super-admin/organizations/{org_id}", response_class=JSONResponse)
+@app.delete("/admin/super-admin/organizations/{org_id}", response_class=JSONResponse, dependencies=[Depends(require_super_admin)])
 def sa_soft_delete_org(org_id: uuid.UUID, db: Session = Depends(get_db)):
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org:
@@ -1002,11 +1052,11 @@ def sa_soft_delete_org(org_id: uuid.UUID, db: Session = Depends(get_db)):
     )
 
     db.commit()
-    db.refresh(org)
+    invalidate_org_cache(org_id)
 
     return JSONResponse({
       "message": "Organization deactivated",
-      "id": str(org.id),
+      "id": str(org_id),
       "deactivated_members": int(deactivated_total)
     })
     
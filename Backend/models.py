@@ -1,7 +1,7 @@
 # models.py
 import uuid
 import enum
-from sqlalchemy import Column, Text, TIMESTAMP, ForeignKey, Enum, Integer, Boolean, text
+from sqlalchemy import Column, Text, TIMESTAMP, ForeignKey, Enum, Integer, Boolean, Index, and_, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base, relationship
@@ -23,8 +23,10 @@ class Organization(Base):
     description = Column(Text)
     is_active = Column(Boolean, default=True, server_default=text("true"), nullable=False)
     
-    users = relationship("User", back_populates="organization", cascade="all, delete-orphan")
-    documents = relationship("Document", back_populates="organization", cascade="all, delete-orphan")
+    # passive_deletes: the ON DELETE CASCADE foreign keys remove children in the same DELETE,
+    # so the ORM doesn't load every child row just to delete it one by one
+    users = relationship("User", back_populates="organization", cascade="all, delete-orphan", passive_deletes=True)
+    documents = relationship("Document", back_populates="organization", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class User(Base):
@@ -40,9 +42,22 @@ class User(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     is_active = Column(Boolean, default=True, server_default=text("true"), nullable=False)
 
-    organization = relationship("Organization", back_populates="users")
-    documents = relationship("Document", back_populates="uploader")
-    chats = relationship("Chat", back_populates="user")
+    # Routes read the organization through an explicit join or the org cache; fail loudly
+    # instead of silently issuing a per-user SELECT if someone touches it unloaded
+    organization = relationship("Organization", back_populates="users", lazy="raise_on_sql")
+    documents = relationship("Document", back_populates="uploader", passive_deletes=True)
+    chats = relationship("Chat", back_populates="user", passive_deletes=True)
+
+# Mirror the indexes main._ensure_indexes creates on existing databases, so create_all builds
+# them too; username's own unique index already serves the login lookups.
+Index(
+    "ix_users_org_role_where_active", User.organization_id, User.role,
+    postgresql_where=User.is_active,
+)
+Index(
+    "ux_users_email_active_lower", func.lower(User.email), unique=True,
+    postgresql_where=and_(User.is_active, User.email.isnot(None)),
+)
 
 
 class Document(Base):
@@ -59,7 +74,7 @@ class Document(Base):
 
     organization = relationship("Organization", back_populates="documents")
     uploader = relationship("User", back_populates="documents")
-    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
+    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class DocumentChunk(Base):
@@ -79,10 +94,12 @@ class Chat(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(Text)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # Fetch created_at with INSERT ... RETURNING instead of a refresh after commit
+    __mapper_args__ = {"eager_defaults": True}
 
     user = relationship("User", back_populates="chats")
-    messages = relationship("ChatMessage", back_populates="chat", cascade="all, delete-orphan")
-    feedbacks = relationship("Feedback", back_populates="chat", cascade="all, delete-orphan")
+    messages = relationship("ChatMessage", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True)
+    feedbacks = relationship("Feedback", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class ChatMessage(Base):
@@ -96,7 +113,7 @@ class ChatMessage(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
     chat = relationship("Chat", back_populates="messages")
-    feedbacks = relationship("Feedback", back_populates="message", cascade="all, delete-orphan")
+    feedbacks = relationship("Feedback", back_populates="message", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Feedback(Base):
@@ -109,6 +126,7 @@ class Feedback(Base):
     comment = Column(Text)
     seen_by_admin = Column(Boolean, default=False, server_default=text("false"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    __mapper_args__ = {"eager_defaults": True}
 
     chat = relationship("Chat", back_populates="feedbacks")
     message = relationship("ChatMessage", back_populates="feedbacks")
@@ -120,4 +138,5 @@ class SuperAdmin(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     username = Column(Text, unique=True, nullable=False)
     password_hash = Column(Text, nullable=False)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    __mapper_args__ = {"eager_defaults": True}
@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Union
+
+from pypdf import PdfReader
+
+# Kept apart from ingestion.py on purpose: pool workers import this module, and importing
+# ingestion would load the embedding model in every worker.
+
+PdfSource = Union[str, bytes]
+
+# Below this, splitting the file across workers (each re-parses it) costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+# Never fork: the server process runs threads and has torch loaded, and a forked copy of that
+# state can deadlock. forkserver starts workers from a clean process; spawn where it's missing.
+PDF_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """The shared worker pool, started on the first large PDF and reused after that."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context(PDF_START_METHOD),
+            )
+        return _POOL
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes (app shutdown)."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _open(source: PdfSource) -> PdfReader:
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _pages_text(args) -> List[str]:
+    path, start, stop = args
+    pages = PdfReader(path).pages
+    return [(pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def _read_pages_parallel(path: str, n: int) -> str:
+    # One contiguous range per worker, so each process parses the document once
+    size = -(-n // PDF_WORKERS)
+    ranges = [(path, s, min(s + size, n)) for s in range(0, n, size)]
+    parts = _get_pool().map(_pages_text, ranges)
+    return "\n".join(text for part in parts for text in part)
+
+
+def read_pdf(source: PdfSource) -> str:
+    """Page texts joined by newlines; large files are split into page ranges across the worker pool."""
+    reader = _open(source)
+    n = len(reader.pages)
+    if n < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS < 2:
+        return "\n".join([(p.extract_text() or "") for p in reader.pages])
+
+    if isinstance(source, str):
+        return _read_pages_parallel(source, n)
+    # Workers get a path, not the document: the bytes are written to disk once instead of
+    # being pickled into every task
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(source)
+    try:
+        return _read_pages_parallel(f.name, n)
+    finally:
+        os.unlink(f.name)
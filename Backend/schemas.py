@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from uuid import UUID
 
 class OrgCreate(BaseModel):
@@ -9,7 +9,7 @@ class OrgCreate(BaseModel):
 class UserCreate(BaseModel):
     username: str
     password: Optional[str] = None
-    role: str = Field(pattern="^(super-admin|admin|user)$")
+    role: Literal["super-admin", "admin", "user"]
     organization_id: Optional[UUID] = None  # Optional for super-admin
     email: Optional[str] = None
 
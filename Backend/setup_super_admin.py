@@ -29,8 +29,8 @@ def create_super_admin(username: str, password: str):
             print(f"Super-admin user '{username}' already exists!")
             return False
         
-        # Hash the password
-        password_hash = hash_password(password)
+        # Hash the password (bootstrap cost; upgraded on first login)
+        password_hash = hash_password(password, category="bootstrap")
         
         # Create new super-admin
         new_super_admin = SuperAdmin(
@@ -39,12 +39,14 @@ def create_super_admin(username: str, password: str):
         )
         
         db.add(new_super_admin)
+        # created_at comes back with the INSERT; read it before commit expires the instance
+        db.flush()
+        user_id, created_at = new_super_admin.id, new_super_admin.created_at
         db.commit()
-        db.refresh(new_super_admin)
         
         print(f"✅ Super-admin user '{username}' created successfully!")
-        print(f"   User ID: {new_super_admin.id}")
-        print(f"   Created at: {new_super_admin.created_at}")
+        print(f"   User ID: {user_id}")
+        print(f"   Created at: {created_at}")
         print("\nYou can now log in with these credentials at /login")
         return True
         
@@ -0,0 +1,150 @@
+# test_admin_auth.py
+# Runs against the database in DATABASE_URL (through asyncpg, like the routes); every
+# test creates its own organization and deletes it again, which cascades to its users.
+import asyncio
+import uuid
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from admin_auth import (
+    _conflict_detail,
+    _ensure_admin_active,
+    get_all_organizations,
+    get_organization_users_super_admin,
+    get_organizations,
+    hash_password,
+    invalidate_org_cache,
+)
+from database import AsyncSessionLocal, async_engine
+from models import Organization, User
+
+_PASSWORD_HASH = hash_password("test-password", category="temp")
+
+
+async def _create_org(db, *roles):
+    """An organization with one user per role; returns (org_id, [user ids])."""
+    org_id = uuid.uuid4()
+    db.add(Organization(id=org_id, name=f"test-org-{org_id}"))
+    user_ids = []
+    for role in roles:
+        user_id = uuid.uuid4()
+        db.add(User(
+            id=user_id,
+            username=f"test-{user_id}",
+            email=f"{user_id}@example.com",
+            password_hash=_PASSWORD_HASH,
+            role=role,
+            organization_id=org_id,
+        ))
+        user_ids.append(user_id)
+    await db.commit()
+    return org_id, user_ids
+
+
+def _run(test):
+    """Run an async test on a fresh loop; pooled asyncpg connections can't outlive their loop."""
+    async def main():
+        try:
+            return await test()
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+async def _drop_org(db, org_id):
+    await db.rollback()
+    await db.execute(delete(Organization).where(Organization.id == org_id))
+    await db.commit()
+
+
+def test_email_of_inactive_user_maps_to_conflict():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            org_id, (user_id,) = await _create_org(db, "user")
+            try:
+                await db.execute(update(User).where(User.id == user_id).values(is_active=False))
+                await db.commit()
+                db.add(User(
+                    username=f"test-{uuid.uuid4()}",
+                    email=f"{user_id}@example.com",
+                    password_hash=_PASSWORD_HASH,
+                    role="user",
+                    organization_id=org_id,
+                ))
+                try:
+                    await db.commit()
+                except IntegrityError as e:
+                    return _conflict_detail(e)
+                raise AssertionError("duplicate email was inserted")
+            finally:
+                await _drop_org(db, org_id)
+
+    assert _run(run) == "Email already exists"
+
+
+def test_super_admin_org_users_serialize_asyncpg_rows():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            org_id, user_ids = await _create_org(db, "admin", "user", "user")
+            try:
+                first = await get_organization_users_super_admin(org_id, after=None, limit=2, db=db)
+                cursor = uuid.UUID(first.headers["x-next-cursor"])
+                rest = await get_organization_users_super_admin(org_id, after=cursor, limit=2, db=db)
+                assert "x-next-cursor" not in rest.headers
+                return org_id, user_ids, orjson.loads(first.body) + orjson.loads(rest.body)
+            finally:
+                await _drop_org(db, org_id)
+
+    org_id, user_ids, users = _run(run)
+    assert [u["id"] for u in users] == sorted(str(i) for i in user_ids)
+    assert {u["organization_id"] for u in users} == {str(org_id)}
+
+
+def _request(headers=()):
+    return Request({"type": "http", "method": "GET", "headers": [(k.encode(), v.encode()) for k, v in headers]})
+
+
+def test_organization_listings_serialize_asyncpg_rows():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            org_id, _ = await _create_org(db, "admin", "user")
+            invalidate_org_cache()
+            try:
+                dropdown = await get_organizations(_request(), db=db)
+                revalidated = await get_organizations(_request([("if-none-match", dropdown.headers["etag"])]), db=db)
+                listing = await get_all_organizations(db=db)
+                return org_id, dropdown, revalidated, listing
+            finally:
+                await _drop_org(db, org_id)
+                invalidate_org_cache()
+
+    org_id, dropdown, revalidated, listing = _run(run)
+    assert dropdown.status_code == 200
+    assert str(org_id) in {o["id"] for o in orjson.loads(dropdown.body)}
+    assert revalidated.status_code == 304
+    (org,) = [o for o in orjson.loads(listing.body) if o["id"] == str(org_id)]
+    assert (org["user_count"], org["admin_count"]) == (2, 1)
+
+
+def test_deactivated_admin_token_is_rejected():
+    async def run():
+        async with AsyncSessionLocal() as db:
+            org_id, (admin_id,) = await _create_org(db, "admin")
+            claims = {"sub": str(admin_id), "role": "admin", "org": str(org_id)}
+            try:
+                await _ensure_admin_active(db, claims)
+                await db.execute(update(User).where(User.id == admin_id).values(is_active=False))
+                await db.commit()
+                with pytest.raises(HTTPException) as exc:
+                    await _ensure_admin_active(db, claims)
+                return exc.value.status_code
+            finally:
+                await _drop_org(db, org_id)
+
+    assert _run(run) == 401